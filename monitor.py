@@ -1,55 +1,242 @@
 #!/usr/bin/env python3
 import os
-import shutil
+import errno
 import time
 import sys
 import argparse
 import logging
+import logging.handlers
 import json
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from threading import Lock
-from collections import defaultdict
+import queue
+import stat
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from threading import Thread, Event
+from collections import defaultdict, deque
+from itertools import islice
 import rpyc
 
-# Function to compare source and destination files and return files to be transferred
-def compare_and_get_files_to_sync(source_dir, dest_dir, logger, rpc_connection=None, last_scan_time=None):
-    source_files = set()
-    dest_files = set()
-
-    def collect_files(dir_path, relative_to):
-        files_set = set()
+# Function to yield regular files under root as relative paths, as they are discovered,
+# only those modified after since when it is given. Paths that could not be read are
+# appended to scan_errors when it is given.
+def iter_files(root, logger, relative_prefix="", since=None, scan_errors=None):
+    # Walk with os.scandir so file types come from the directory entries
+    # themselves instead of one extra stat() per entry. Relative paths are
+    # built by concatenation during descent rather than with os.path.relpath.
+    pending = deque([(root, relative_prefix)])
+    while pending:
+        current_dir, relative_prefix = pending.pop()
         try:
-            for root, dirs, files in os.walk(dir_path):
-                for file in files:
-                    files_set.add(os.path.relpath(os.path.join(root, file), relative_to))
+            with os.scandir(current_dir) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append((entry.path, relative_prefix + entry.name + os.sep))
+                        elif entry.is_file(follow_symlinks=False):
+                            if since and entry.stat(follow_symlinks=False).st_mtime <= since:
+                                continue
+                            # Interned so source and destination sets share one string per path
+                            yield sys.intern(relative_prefix + entry.name)
+                    except OSError as e:
+                        # Typically removed since the directory was read; the rest of it is still listed
+                        logger.error(f"Error accessing {entry.path}: {e}")
+                        if scan_errors is not None and not isinstance(e, FileNotFoundError):
+                            scan_errors.append(entry.path)
         except Exception as e:
-            logger.error(f"Error traversing directory {dir_path}: {e}")
-        return files_set
+            logger.error(f"Error traversing directory {current_dir}: {e}")
+            if scan_errors is not None:
+                scan_errors.append(current_dir)
+
+# Number of threads used to scan the top-level subdirectories of one tree
+SCAN_WORKERS = 16
 
-    # If RPC connection is available, use it for source directory
-    if rpc_connection:
+# Number of paths a subtree scan hands over at a time
+SCAN_PAGE_SIZE = 1000
+# Pages that may wait for the consumer before subtree scans block, bounding memory when copies fall behind
+SCAN_QUEUE_PAGES = 64
+
+# Function to yield all files under root as they are found, scanning each top-level subdirectory on its own thread
+def iter_files_parallel(root, logger, max_workers=SCAN_WORKERS, since=None, scan_errors=None):
+    subdirs = []
+    try:
+        with os.scandir(root) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                    elif entry.is_file(follow_symlinks=False):
+                        if since and entry.stat(follow_symlinks=False).st_mtime <= since:
+                            continue
+                        yield sys.intern(entry.name)
+                except OSError as e:
+                    logger.error(f"Error accessing {entry.path}: {e}")
+                    if scan_errors is not None and not isinstance(e, FileNotFoundError):
+                        scan_errors.append(entry.path)
+    except Exception as e:
+        # Subdirectories found before the error are still scanned below
+        logger.error(f"Error traversing directory {root}: {e}")
+        if scan_errors is not None:
+            scan_errors.append(root)
+
+    # Each subtree scan passes pages of paths back through the queue and
+    # None once it is done, so the caller can start on them mid-scan
+    pages = queue.Queue(maxsize=SCAN_QUEUE_PAGES)
+    # Set when the caller stops consuming, so scans give up instead of blocking on a full queue
+    stopped = Event()
+
+    def put_page(page):
+        while not stopped.is_set():
+            try:
+                pages.put(page, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def scan_subdir(name):
         try:
-            source_files_list, scan_time = rpc_connection.root.scan_directory(source_dir, last_scan_time)
-            source_files = set(source_files_list)
-            logger.info(f"Retrieved {len(source_files)} files from RPC scanner")
-        except Exception as e:
-            logger.error(f"RPC scan failed, falling back to local scan: {e}")
-            rpc_connection = None
+            page = []
+            for file in iter_files(os.path.join(root, name), logger, name + os.sep, since, scan_errors):
+                if stopped.is_set():
+                    return
+                page.append(file)
+                if len(page) >= SCAN_PAGE_SIZE:
+                    if not put_page(page):
+                        return
+                    page = []
+            put_page(page)
+        finally:
+            put_page(None)
+
+    # Directory listing on network filesystems is latency bound, so
+    # independent subtrees are listed concurrently
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scan")
+    try:
+        for name in subdirs:
+            executor.submit(scan_subdir, name)
+        running = len(subdirs)
+        while running:
+            page = pages.get()
+            if page is None:
+                running -= 1
+            else:
+                yield from page
+    finally:
+        # Also reached when the caller closes the generator early (interrupt or
+        # error): queued scans are cancelled and running ones stop at their next file
+        stopped.set()
+        while True:
+            try:
+                pages.get_nowait()
+            except queue.Empty:
+                break
+        executor.shutdown(wait=False, cancel_futures=True)
+
+# Function to collect all files under root into a set
+def collect_files(root, logger, max_workers=SCAN_WORKERS, since=None, scan_errors=None):
+    return set(iter_files_parallel(root, logger, max_workers, since, scan_errors))
+
+# Number of paths per page requested from the scanner service
+RPC_PAGE_SIZE = 10000
+
+# Function to compare source and destination files and return files to be transferred.
+# Source paths a local scan could not read are appended to scan_errors when it is given.
+def compare_and_get_files_to_sync(source_dir, dest_dir, logger, rpc_connection=None, last_scan_time=None, dest_files=None, scan_errors=None):
+    source_files = set()
+
+    # Both scans are I/O bound and usually on different mounts, so the
+    # destination is scanned in the background while the source is listed.
+    # A caller that already knows the destination contents skips that scan.
+    # An incremental listing (files modified after last_scan_time) is usually
+    # empty, so in that case the destination scan waits until there is
+    # something to compare.
+    incremental_scan = bool(last_scan_time)
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="dest-scan") as scan_executor:
+        dest_future = None
 
-    # If no RPC or RPC failed, use original local scanning method
-    if not rpc_connection:
-        logger.info(f"Scanning source directory: {source_dir}...")
-        source_files = collect_files(source_dir, source_dir)
-        logger.info(f"Completed scanning source directory. Found {len(source_files)} files.")
+        def start_dest_scan():
+            logger.info(f"Scanning destination directory: {dest_dir}...")
+            return scan_executor.submit(collect_files, dest_dir, logger)
 
-    logger.info(f"Scanning destination directory: {dest_dir}...")
-    dest_files = collect_files(dest_dir, dest_dir)
-    logger.info(f"Completed scanning destination directory. Found {len(dest_files)} files.")
+        if dest_files is None and not incremental_scan:
+            dest_future = start_dest_scan()
+
+        # If RPC connection is available, use it for source directory
+        if rpc_connection:
+            try:
+                # Pages are merged as they arrive while the service is still walking
+                try:
+                    for page in rpc_connection.root.scan_directory_pages(source_dir, last_scan_time, RPC_PAGE_SIZE):
+                        # One bytes object per page instead of a boxed string per path;
+                        # older services send a tuple of paths
+                        if isinstance(page, bytes):
+                            page = os.fsdecode(page).split("\0")
+                        source_files.update(sys.intern(file) for file in page)
+                except AttributeError:
+                    # Scanner service predating paged scans
+                    source_files_list, scan_time = rpc_connection.root.scan_directory(source_dir, last_scan_time)
+                    source_files = {sys.intern(file) for file in source_files_list}
+                logger.info(f"Retrieved {len(source_files)} files from RPC scanner")
+            except Exception as e:
+                logger.error(f"RPC scan failed, falling back to local scan: {e}")
+                rpc_connection = None
+
+        # If no RPC or RPC failed, use original local scanning method
+        if not rpc_connection:
+            logger.info(f"Scanning source directory: {source_dir}...")
+            source_files = collect_files(source_dir, logger, since=last_scan_time, scan_errors=scan_errors)
+            logger.info(f"Completed scanning source directory. Found {len(source_files)} files.")
+
+        if not source_files and not dest_future:
+            logger.info("No new or modified source files.")
+            return [], dest_files
+
+        if dest_files is None and not dest_future:
+            dest_future = start_dest_scan()
+        if dest_future:
+            dest_files = dest_future.result()
+            logger.info(f"Completed scanning destination directory. Found {len(dest_files)} files.")
 
     files_to_sync = list(source_files - dest_files)
     logger.info(f"Identified {len(files_to_sync)} files to sync.")
 
-    return files_to_sync, source_files, dest_files
+    # The source set is dropped here; only the diff and the destination set (kept by main) outlive the call
+    return files_to_sync, dest_files
+
+# Log files written into the destination project directory
+LOG_FILE_NAMES = ("error_log.txt", "sync_log.txt")
+# File in the destination project directory recording the last complete scan, for --resume
+SYNC_STATE_FILE_NAME = ".sync_state.json"
+
+# Function to check whether a destination directory holds nothing but our own log and state files
+def is_fresh_destination(dest_dir):
+    try:
+        with os.scandir(dest_dir) as entries:
+            return all(entry.name in LOG_FILE_NAMES + (SYNC_STATE_FILE_NAME,) and entry.is_file(follow_symlinks=False) for entry in entries)
+    except FileNotFoundError:
+        return True
+
+# Function to read the time of the last complete scan recorded in the destination, or None
+def load_last_scan_time(dest_dir, logger):
+    try:
+        with open(os.path.join(dest_dir, SYNC_STATE_FILE_NAME)) as state_file:
+            return float(json.load(state_file)["last_scan_time"])
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.error(f"Ignoring unreadable sync state: {e}")
+        return None
+
+# Function to record the time of the last complete scan in the destination
+def save_last_scan_time(dest_dir, last_scan_time, logger):
+    state_path = os.path.join(dest_dir, SYNC_STATE_FILE_NAME)
+    try:
+        # Written aside and renamed so an interrupted write never leaves a truncated file
+        with open(state_path + ".tmp", "w") as state_file:
+            json.dump({"last_scan_time": last_scan_time}, state_file)
+        os.replace(state_path + ".tmp", state_path)
+    except Exception as e:
+        logger.error(f"Failed to save sync state: {e}")
 
 # Function to setup logging
 def setup_logging(dest_dir, project_name, verbose):
@@ -58,99 +245,547 @@ def setup_logging(dest_dir, project_name, verbose):
     os.makedirs(dest_dir_project, exist_ok=True)
 
     logger = logging.getLogger("sync_logger")
-    logger.setLevel(logging.DEBUG)
+    # Raised to DEBUG below only if sync_log.txt is there to receive debug records
+    logger.setLevel(logging.INFO)
+    handlers = []
+    sync_log_error = None
 
     # Error log
-    error_log = os.path.join(dest_dir_project, "error_log.txt")
+    error_log = os.path.join(dest_dir_project, LOG_FILE_NAMES[0])
     error_handler = logging.FileHandler(error_log)
     error_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s", datefmt="%Y-%m-%d %H:%M:%S"))
     error_handler.setLevel(logging.ERROR)
-    logger.addHandler(error_handler)
+    handlers.append(error_handler)
 
     # Console log
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s", datefmt="%H:%M:%S"))
     console_handler.setLevel(logging.INFO)
-    logger.addHandler(console_handler)
+    handlers.append(console_handler)
 
     if verbose:
-        sync_log = os.path.join(dest_dir_project, "sync_log.txt")    
+        sync_log = os.path.join(dest_dir_project, LOG_FILE_NAMES[1])
         try:
             file_handler = logging.FileHandler(sync_log)
             file_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s", datefmt="%Y-%m-%d %H:%M:%S"))
             file_handler.setLevel(logging.DEBUG)
-            logger.addHandler(file_handler)
+            handlers.append(file_handler)
+            logger.setLevel(logging.DEBUG)
         except Exception as e:
-            logger.error(f"Failed to initialize sync_log.txt: {e}")
+            sync_log_error = e
+
+    # Copy threads only enqueue records; a single listener thread does the actual writes
+    log_queue = queue.Queue(-1)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    log_listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    log_listener.start()
+
+    if sync_log_error:
+        logger.error(f"Failed to initialize sync_log.txt: {sync_log_error}")
+
+    return logger, error_log, log_listener
 
-    return logger, error_log
+# Largest byte count requested from the kernel per copy_file_range/sendfile call
+COPY_CHUNK_SIZE = 1 << 30
+# Errors meaning a kernel copy call is not supported for this pair of files
+UNSUPPORTED_COPY_ERRNOS = (errno.ENOSYS, errno.EXDEV, errno.EOPNOTSUPP, errno.EINVAL)
+# Buffer size for the userspace fallback copy
+USERSPACE_COPY_BUFFER_SIZE = 1 << 20
 
-# Function to copy a file with retries
-def copy_file_with_retries(file_source, file_dest, retries=3, delay=5, logger=None):
+# Function to repeat a kernel copy call until EOF, rewinding both files and returning False if unsupported
+def kernel_copy(copy_chunk, source, dest):
+    try:
+        copied = copy_chunk()
+        # Some filesystems (procfs-like, some FUSE/network ones on older kernels)
+        # answer 0 without copying anything; only trust that for an empty source
+        if not copied and os.fstat(source.fileno()).st_size > 0:
+            return False
+        while copied:
+            copied = copy_chunk()
+        return True
+    except OSError as e:
+        if e.errno not in UNSUPPORTED_COPY_ERRNOS:
+            raise
+        source.seek(0)
+        dest.seek(0)
+        dest.truncate()
+        return False
+
+# Function to copy between open files through one reused buffer, when no kernel copy call works
+def userspace_copy(source, dest):
+    # readinto a preallocated buffer avoids a new bytes object per chunk, and
+    # large chunks keep each thread inside the GIL-free read/write calls longer
+    buffer = memoryview(bytearray(USERSPACE_COPY_BUFFER_SIZE))
+    while True:
+        read = source.readinto(buffer)
+        if not read:
+            break
+        dest.write(buffer[:read])
+    dest.flush()
+
+# Function to copy timestamps, extended attributes and permission bits between open files, like shutil.copystat
+def copy_metadata(source_fd, dest_fd):
+    # Working on the open descriptors avoids re-resolving both paths for every call
+    source_stat = os.fstat(source_fd)
+    os.utime(dest_fd, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+    if hasattr(os, "listxattr"):
+        try:
+            names = os.listxattr(source_fd)
+        except OSError as e:
+            if e.errno not in (errno.ENOTSUP, errno.ENODATA, errno.EINVAL):
+                raise
+            names = []
+        for name in names:
+            try:
+                os.setxattr(dest_fd, name, os.getxattr(source_fd, name))
+            except OSError as e:
+                if e.errno not in (errno.EPERM, errno.ENOTSUP, errno.ENODATA, errno.EINVAL):
+                    raise
+    os.chmod(dest_fd, stat.S_IMODE(source_stat.st_mode))
+
+# Function to pass a page cache hint for a whole file, where supported; it is only advice, so failures are ignored
+def advise(fd, advice_name):
+    if hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(fd, 0, 0, getattr(os, advice_name))
+        except OSError:
+            pass
+
+# Function to copy a file without bouncing data through userspace, then its metadata like shutil.copy2
+def fast_copy(file_source, file_dest):
+    with open(file_source, "rb") as source, open(file_dest, "wb") as dest:
+        source_fd, dest_fd = source.fileno(), dest.fileno()
+        # Source files are read once front to back: ask for aggressive readahead
+        advise(source_fd, "POSIX_FADV_SEQUENTIAL")
+        # copy_file_range can reflink or copy server-side, sendfile works across
+        # any pair of filesystems, and a plain userspace copy is the last resort
+        copied = False
+        if hasattr(os, "copy_file_range"):
+            copied = kernel_copy(lambda: os.copy_file_range(source_fd, dest_fd, COPY_CHUNK_SIZE), source, dest)
+        if not copied and hasattr(os, "sendfile"):
+            copied = kernel_copy(lambda: os.sendfile(dest_fd, source_fd, None, COPY_CHUNK_SIZE), source, dest)
+        if not copied:
+            userspace_copy(source, dest)
+        copy_metadata(source_fd, dest_fd)
+        # and drop them from the page cache afterwards, so the sync does not evict
+        # the working set of whatever else runs on the source host
+        advise(source_fd, "POSIX_FADV_DONTNEED")
+
+# Errors that another attempt at the same copy will not fix
+PERMANENT_COPY_ERRNOS = (errno.ENOENT, errno.EPERM, errno.EACCES)
+
+# Function to copy a file with retries, backing off exponentially from base_delay
+def copy_file_with_retries(file_source, file_dest, retries=3, base_delay=0.05, logger=None):
     attempt = 0
     while attempt < retries:
         try:
-            shutil.copy2(file_source, file_dest)
+            fast_copy(file_source, file_dest)
             return True
         except Exception as e:
-            logger.error(f"Error copying {file_source} to {file_dest}: {e}")
+            error_code = errno.errorcode.get(getattr(e, "errno", None), "-")
+            logger.error(f"Error copying {file_source} to {file_dest} ({error_code}): {e}")
+            if isinstance(e, OSError) and e.errno in PERMANENT_COPY_ERRNOS:
+                return False
             attempt += 1
             if attempt < retries:
                 logger.info(f"Retrying {file_source}... Attempt {attempt}/{retries}")
-                time.sleep(delay)
+                # 0.05s, 0.2s, 0.8s, ... so a transient error holds up the rest of the batch only briefly
+                time.sleep(base_delay * 4 ** (attempt - 1))
             else:
                 return False
     return False
 
-# Function to copy a batch of files
-def copy_file_batch(files_batch, source_dir, dest_dir, logger, verbose, retries=3):
+# Function to copy a batch of files, returning the relative paths copied
+def copy_file_batch(files_batch, source_dir, dest_dir, logger, verbose, retries=3, created_dirs=None):
     results = []
+    # Directories already created during this sync (normally all of them, by
+    # sync_files), shared by all batches of it
+    if created_dirs is None:
+        created_dirs = set()
+    # Plain concatenation onto fixed prefixes is much cheaper than os.path.join/dirname per file
+    source_prefix = os.path.join(source_dir, "")
+    dest_prefix = os.path.join(dest_dir, "")
     for file in files_batch:
-        file_source = os.path.join(source_dir, file)
-        if os.path.islink(file_source):
-            logger.debug(f"Skipping symbolic link: {file_source}")
-            continue
-        file_dest = os.path.join(dest_dir, file)
-        os.makedirs(os.path.dirname(file_dest), exist_ok=True)
+        # Symlinks never reach here: the scanners only report regular files
+        file_source = source_prefix + file
+        file_dest = dest_prefix + file
+        parent_dir = file.rpartition(os.sep)[0]
+        if parent_dir not in created_dirs:
+            os.makedirs(dest_prefix + parent_dir, exist_ok=True)
+            created_dirs.add(parent_dir)
         success = copy_file_with_retries(file_source, file_dest, retries=retries, logger=logger)
         if success:
-            results.append((file_source, file_dest))
-            if verbose:
-                logger.debug(f"Transferred: {file_source} -> {file_dest}")
+            results.append(file)
         else:
             logger.error(f"Failed to transfer: {file_source} -> {file_dest}")
+    # One record per batch rather than one per file, and the list is only
+    # formatted when a debug record would actually be written
+    if verbose and results and logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Transferred %d files:\n%s", len(results), "\n".join(f"{source_prefix}{file} -> {dest_prefix}{file}" for file in results))
     return results
 
-# Function to sync files using multithreading
-def sync_files(source_dir, dest_dir, files_to_sync, logger, verbose, batch_size=100, retries=3):
-    os.makedirs(dest_dir, exist_ok=True)
-    total_files = len(files_to_sync)
-    synced_files_count = 0
-    synced_files_lock = Lock()
+# Function to copy a batch of files with a single rsync process, retrying the whole batch
+def rsync_file_batch(files_batch, source_dir, dest_dir, logger, verbose, retries=3, base_delay=0.05):
+    # rsync reads NUL-separated paths relative to source_dir and creates missing parents itself
+    source_prefix = os.path.join(source_dir, "")
+    dest_prefix = os.path.join(dest_dir, "")
+    command = ["rsync", "-a", "--files-from=-", "--from0", source_prefix, dest_prefix]
+    file_list = b"\0".join(os.fsencode(file) for file in files_batch)
+    attempt = 0
+    while attempt < retries:
+        try:
+            result = subprocess.run(command, input=file_list, capture_output=True)
+            if result.returncode in (0, 24):
+                synced = list(files_batch)
+                if result.returncode == 24:
+                    # Some source files vanished before rsync got to them; the rest were transferred
+                    synced = [file for file in synced if os.path.lexists(dest_prefix + file)]
+                if verbose and logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Transferred %d files:\n%s", len(synced), "\n".join(f"{source_prefix}{file} -> {dest_prefix}{file}" for file in synced))
+                return synced
+            logger.error(f"rsync exited with code {result.returncode}: {result.stderr.decode(errors='replace').strip()}")
+        except Exception as e:
+            logger.error(f"Error running rsync: {e}")
+        attempt += 1
+        if attempt < retries:
+            logger.info(f"Retrying rsync batch of {len(files_batch)} files... Attempt {attempt}/{retries}")
+            # Same backoff as copy_file_with_retries
+            time.sleep(base_delay * 4 ** (attempt - 1))
+
+    logger.error(f"Failed to transfer batch of {len(files_batch)} files from {source_dir} to {dest_dir}")
+    return []
+
+# Function to stream a full source listing into one rsync process while the tree is still being scanned
+def rsync_stream_tree(source_dir, dest_dir, logger):
+    command = ["rsync", "-a", "--files-from=-", "--from0", source_dir.rstrip('/') + '/', dest_dir.rstrip('/') + '/']
+    logger.info(f"Streaming {source_dir} to rsync...")
+    try:
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    except Exception as e:
+        logger.error(f"Error running rsync: {e}")
+        return False
 
-    logger.info(f"Starting synchronization of {total_files} files to {dest_dir}.")
-    file_batches = [files_to_sync[i:i + batch_size] for i in range(0, total_files, batch_size)]
+    streamed_files = 0
 
+    def produce():
+        nonlocal streamed_files
+        try:
+            for file in iter_files(source_dir, logger):
+                process.stdin.write(os.fsencode(file) + b"\0")
+                streamed_files += 1
+        except BrokenPipeError:
+            pass
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    producer = Thread(target=produce, daemon=True)
+    producer.start()
+    stderr = process.stderr.read()
+    process.wait()
+    producer.join()
+
+    # 24: some source files vanished while rsync was running
+    if process.returncode not in (0, 24):
+        logger.error(f"rsync exited with code {process.returncode}: {stderr.decode(errors='replace').strip()}")
+        return False
+    logger.info(f"Streamed {streamed_files} files from {source_dir} to rsync.")
+    return True
+
+# Default copy thread count. Copies wait on storage, not the CPU (the GIL is
+# released inside copy_file_range/sendfile), so far more threads than cores pay off
+DEFAULT_WORKERS = max(32, (os.cpu_count() or 1) * 8)
+# Files per copy batch; small so many batches are in flight at once
+DEFAULT_BATCH_SIZE = 10
+# Files per rsync batch; larger so process start-up is amortised
+RSYNC_BATCH_SIZE = 100
+# Default number of concurrent rsync batches; each one is a process tree with its own handshake
+RSYNC_WORKERS = 8
+# File cap per batch when batches are sized by bytes, so many small files share one batch
+BYTE_BATCH_MAX_FILES = 1000
+# Per-file copy time (seconds) of the probe batch above which concurrency is capped
+SLOW_COPY_SECONDS = 0.05
+# Probe throughput (bytes per second) above which a high per-file time is put down to
+# file size rather than destination latency, and concurrency is left alone
+SLOW_COPY_BYTES_PER_SECOND = 64 << 20
+# Per-file copy time (seconds) of the probe batch below which more batches are queued ahead
+FAST_COPY_SECONDS = 0.001
+
+# Function to yield successive lists of up to batch_size items without slicing the whole input upfront
+def batched(iterable, batch_size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
+# Function to yield lists of up to batch_size files, ending a batch early once the files in it reach max_bytes
+def batched_by_size(files, batch_size, max_bytes, source_dir):
+    # Sizes are looked up while batching, one lstat per file on the submitting thread
+    source_prefix = os.path.join(source_dir, "")
+    batch = []
+    batch_bytes = 0
+    for file in files:
+        try:
+            batch_bytes += os.lstat(source_prefix + file).st_size
+        except OSError:
+            # The copy itself reports files that cannot be read
+            pass
+        batch.append(file)
+        if len(batch) >= batch_size or batch_bytes >= max_bytes:
+            yield batch
+            batch = []
+            batch_bytes = 0
+    if batch:
+        yield batch
+
+# Minimum seconds between two progress log lines of one sync
+PROGRESS_LOG_INTERVAL = 1.0
+
+# Function to sync files using multithreading, returning the relative paths synced.
+# files_to_sync may also be an iterator still being produced by a scan.
+def sync_files(source_dir, dest_dir, files_to_sync, logger, verbose, batch_size=None, retries=3, executor=None, use_rsync=False, max_workers=None, batch_bytes=None):
+    os.makedirs(dest_dir, exist_ok=True)
+    # An iterator is copied as it is produced, so its total is not known up front
+    total_files = len(files_to_sync) if hasattr(files_to_sync, "__len__") else None
+    # Only the submitting thread updates these, from each batch's returned results
+    synced_files_count = 0
+    failed_files_count = 0
+    synced_files = []
+    max_workers = max_workers or (RSYNC_WORKERS if use_rsync else DEFAULT_WORKERS)
+    if batch_bytes:
+        batch_size = batch_size or BYTE_BATCH_MAX_FILES
+    else:
+        batch_size = batch_size or (RSYNC_BATCH_SIZE if use_rsync else DEFAULT_BATCH_SIZE)
+    created_dirs = set()
+
+    if total_files is None:
+        logger.info(f"Starting synchronization to {dest_dir} while files are found.")
+    else:
+        logger.info(f"Starting synchronization of {total_files} files to {dest_dir}.")
+
+    # Create each destination directory once before dispatch, parents before
+    # children, so copy workers only find them in created_dirs (rsync makes its own).
+    # Streamed files are neither pre-scanned nor sorted; copy workers create their directories.
+    if not use_rsync and total_files is not None:
+        dest_prefix = os.path.join(dest_dir, "")
+        for parent_dir in sorted({file.rpartition(os.sep)[0] for file in files_to_sync}, key=len):
+            try:
+                os.makedirs(dest_prefix + parent_dir, exist_ok=True)
+                created_dirs.add(parent_dir)
+            except OSError as e:
+                logger.error(f"Failed to create directory {dest_prefix + parent_dir}: {e}")
+
+    # Grouping files by parent directory keeps each batch to a few directories,
+    # which is friendlier to directory lookups on both ends than set order
+    if total_files is not None:
+        files_to_sync = sorted(files_to_sync, key=lambda file: file.rpartition(os.sep)[0])
+    # A byte budget keeps a few huge files from landing in one batch while other
+    # workers idle, and lets small files travel in larger batches
+    if batch_bytes:
+        file_batches = batched_by_size(files_to_sync, batch_size, batch_bytes, source_dir)
+    else:
+        file_batches = batched(files_to_sync, batch_size)
+
+    # Returns the paths synced and the number of files that failed
     def sync_batch(batch):
         try:
-            results = copy_file_batch(batch, source_dir, dest_dir, logger, verbose, retries)
-            with synced_files_lock:
-                nonlocal synced_files_count
-                synced_files_count += len(results)
-            return results
+            if use_rsync:
+                results = rsync_file_batch(batch, source_dir, dest_dir, logger, verbose, retries)
+            else:
+                results = copy_file_batch(batch, source_dir, dest_dir, logger, verbose, retries, created_dirs)
+            return results, len(batch) - len(results)
         except Exception as e:
             logger.error(f"Error syncing batch: {e}")
-            return []
+            return [], len(batch)
+
+    last_logged_progress = -1
+    last_logged_time = 0.0
+
+    def record_progress(batch_result):
+        nonlocal synced_files_count, failed_files_count, last_logged_progress, last_logged_time
+        results, failed = batch_result
+        synced_files_count += len(results)
+        failed_files_count += failed
+        synced_files.extend(results)
+        now = time.monotonic()
+        if total_files is None:
+            if now - last_logged_time >= PROGRESS_LOG_INTERVAL:
+                logger.info(f"Progress: files [{synced_files_count}]")
+                last_logged_time = now
+            return
+        # Failed files count as done, so progress still reaches 100%
+        current_progress = int(((synced_files_count + failed_files_count) / total_files) * 100)
+        # Log at most once per PROGRESS_LOG_INTERVAL and only when the percentage moved, but always at 100%
+        if current_progress == 100 or (current_progress > last_logged_progress and now - last_logged_time >= PROGRESS_LOG_INTERVAL):
+            logger.info(f"Progress: {current_progress}% , files [{synced_files_count}/{total_files}]")
+            last_logged_progress = current_progress
+            last_logged_time = now
+
+    probe_batch = next(file_batches, None)
+    if probe_batch is None:
+        if total_files is None:
+            logger.info("Total files synced: 0.")
+        return synced_files
+
+    # Time the first batch on its own: slow (NFS) destinations get fewer
+    # concurrent batches to avoid stat/mkdir storms, fast ones get more queued
+    in_flight_limit = max_workers
+    probe_start = time.monotonic()
+    probe_result = sync_batch(probe_batch)
+    probe_seconds = time.monotonic() - probe_start
+    per_file_seconds = probe_seconds / len(probe_batch)
+    record_progress(probe_result)
+    # A few large files take long on any destination; only a batch that is slow
+    # per file and also moves few bytes points at per-file (NFS) latency
+    probe_bytes = 0
+    if per_file_seconds > SLOW_COPY_SECONDS:
+        source_prefix = os.path.join(source_dir, "")
+        for file in probe_result[0]:
+            try:
+                probe_bytes += os.lstat(source_prefix + file).st_size
+            except OSError:
+                pass
+    if per_file_seconds > SLOW_COPY_SECONDS and probe_bytes < probe_seconds * SLOW_COPY_BYTES_PER_SECOND:
+        in_flight_limit = min(max_workers, 4)
+        logger.info(f"Slow destination ({per_file_seconds * 1000:.0f} ms per file), limiting to {in_flight_limit} concurrent batches.")
+    elif per_file_seconds < FAST_COPY_SECONDS:
+        in_flight_limit = max_workers * 2
+
+    # Reuse the caller's pool when given so worker threads outlive a single sync cycle
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sync")
+    try:
+        pending = set()
+        # Batches are only cut as pool slots free up, at most in_flight_limit at a time
+        for batch in file_batches:
+            if len(pending) >= in_flight_limit:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    record_progress(future.result())
+            pending.add(executor.submit(sync_batch, batch))
+        for future in as_completed(pending):
+            record_progress(future.result())
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+    if failed_files_count:
+        logger.error(f"Total files synced: {synced_files_count}, failed: {failed_files_count}.")
+    else:
+        logger.info(f"Total files synced: {synced_files_count}.")
+    return synced_files
+
+# Function to check whether a path lives on a network filesystem
+def is_network_filesystem(path):
+    path = os.path.realpath(path)
+    mount_point, fs_type = "", None
+    try:
+        with open("/proc/mounts") as mounts:
+            for line in mounts:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                candidate = fields[1]
+                if (path == candidate or path.startswith(candidate.rstrip('/') + '/')) and len(candidate) >= len(mount_point):
+                    mount_point, fs_type = candidate, fields[2]
+    except OSError:
+        return False
+    return fs_type is not None and fs_type.startswith(("nfs", "cifs", "smb", "lustre"))
+
+# Function to start a filesystem observer that queues created, modified and moved-in paths
+def start_observer(source_dir, event_queue, logger):
+    # inotify does not see changes made by other NFS clients, keep polling there
+    if is_network_filesystem(source_dir):
+        logger.warning(f"{source_dir} is on a network filesystem, falling back to periodic scans.")
+        return None
 
-    with ThreadPoolExecutor() as executor:
-        futures = [executor.submit(sync_batch, batch) for batch in file_batches]
-        for future in as_completed(futures):
-            future.result()
-            with synced_files_lock:
-                current_progress = int((synced_files_count / total_files) * 100)
-                logger.info(f"Progress: {current_progress}% , files [{synced_files_count}/{total_files}]")
+    try:
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+    except ImportError:
+        logger.error("The watchdog package is required for --watch, falling back to periodic scans.")
+        return None
 
-    logger.info(f"Total files synced: {total_files}.")
+    class QueueingEventHandler(FileSystemEventHandler):
+        # New and moved-in directories are queued too and listed when drained,
+        # as files in them may predate the watch on the directory
+        def on_created(self, event):
+            event_queue.put(event.src_path)
+
+        def on_moved(self, event):
+            event_queue.put(event.dest_path)
+
+        def on_modified(self, event):
+            if not event.is_directory:
+                event_queue.put(event.src_path)
+
+        # Finished writes (IN_CLOSE_WRITE, watchdog 2.3+) catch the final state of a file
+        on_closed = on_modified
+
+    observer = Observer()
+    try:
+        observer.schedule(QueueingEventHandler(), source_dir, recursive=True)
+        observer.start()
+    except OSError as e:
+        # ENOSPC/EMFILE: out of inotify watches or instances (fs.inotify.max_user_watches)
+        logger.error(f"Cannot watch {source_dir} ({errno.errorcode.get(e.errno, '-')}): {e}, falling back to periodic scans.")
+        return None
+    logger.info(f"Watching {source_dir} for new files.")
+    return observer
+
+# Function to check that an observer and all its emitter threads are still running
+def observer_is_alive(observer):
+    # An emitter dies when adding a watch for a new directory fails at runtime (ENOSPC)
+    return observer.is_alive() and all(emitter.is_alive() for emitter in observer.emitters)
+
+# Function to collect queued file events, waiting up to timeout for the first one
+def drain_events(event_queue, source_dir, timeout, logger):
+    changed_paths = set()
+    try:
+        changed_paths.add(event_queue.get(timeout=timeout))
+        while True:
+            changed_paths.add(event_queue.get_nowait())
+    except queue.Empty:
+        pass
+
+    files_to_sync = set()
+    for path in changed_paths:
+        try:
+            mode = os.lstat(path).st_mode
+        except OSError:
+            # File was removed again before we got to it
+            continue
+        relative_path = os.path.relpath(path, source_dir)
+        if stat.S_ISREG(mode):
+            files_to_sync.add(relative_path)
+        elif stat.S_ISDIR(mode) and relative_path != os.curdir:
+            files_to_sync.update(iter_files(path, logger, relative_path + os.sep))
+    return list(files_to_sync)
+
+# Function to sleep until a time.monotonic() deadline, on a kernel timer where available
+def sleep_until(deadline):
+    # os.timerfd_* exist from Python 3.13 on Linux
+    if hasattr(os, "timerfd_create"):
+        timer_fd = os.timerfd_create(time.CLOCK_MONOTONIC)
+        try:
+            os.timerfd_settime(timer_fd, flags=os.TFD_TIMER_ABSTIME, initial=deadline)
+            os.read(timer_fd, 8)
+        finally:
+            os.close(timer_fd)
+    else:
+        remaining = deadline - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+
+# Number of scans that reuse the in-memory destination listing before it is rescanned from disk
+DEST_RESCAN_CYCLES = 10
+# Seconds an incremental scan reaches back before the watermark. mtimes on NFS come
+# from the server's clock and some filesystems store them in 1-2 s steps, so a file
+# written just after a scan started can carry an earlier mtime. Files listed again
+# because of this are dropped by the diff against the destination.
+WATERMARK_MARGIN_SECONDS = 10
 
 # Function to get scanner connection
 def get_scanner_connection(host, port, logger):
@@ -161,45 +796,141 @@ def get_scanner_connection(host, port, logger):
         return None
 
 # Main function
-def main(source_dir, dest_dir, timeout, retries, logger, verbose, resume, scanner_host=None, scanner_port=None):
+def main(source_dir, dest_dir, timeout, retries, logger, verbose, resume, scanner_host=None, scanner_port=None, watch=False, max_timeout=None, use_rsync=False, workers=None, batch_bytes=None):
+    rpc_connection = None
+    observer = None
+    # Copy workers are created once and kept warm across polling cycles
+    workers = workers or (RSYNC_WORKERS if use_rsync else DEFAULT_WORKERS)
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sync")
     try:
         dest_dir_project = os.path.join(dest_dir, os.path.basename(source_dir.rstrip('/')))
+        # Destination contents are tracked in memory between cycles. Every
+        # DEST_RESCAN_CYCLES scans both trees are listed in full, to catch changes
+        # made behind our back. Nothing has been synced into a fresh destination
+        # yet, so it starts out known empty.
+        dest_files = set() if is_fresh_destination(dest_dir_project) else None
+        scans_since_full_listing = 0
         os.makedirs(dest_dir_project, exist_ok=True)
 
         # Initialize RPC connection if host is provided
-        rpc_connection = None
         if scanner_host:
             rpc_connection = get_scanner_connection(scanner_host, scanner_port, logger)
             if rpc_connection:
                 logger.info(f"Connected to scanner service at {scanner_host}:{scanner_port}")
 
-        last_scan_time = 0 if not resume else time.time() - timeout
+        # Start watching before the first scan so files written during it are not missed
+        event_queue = queue.Queue()
+        if watch:
+            if scanner_host:
+                logger.warning("--watch is ignored when a scanner service is used.")
+            else:
+                observer = start_observer(source_dir, event_queue, logger)
+
+        # Scans after the first only list files modified since the last complete
+        # one; --resume picks that point up from the previous run
+        last_scan_time = (load_last_scan_time(dest_dir_project, logger) or 0) if resume else 0
+        initial_scan_done = False
+        # Poll interval backs off while the source stays idle, up to max_timeout
+        max_timeout = max(max_timeout or timeout, timeout)
+        poll_interval = timeout
 
         while True:
+            # Checks are spaced from the start of each cycle so scan and copy time do not stretch the interval
+            cycle_start = time.monotonic()
+
             # If RPC connection failed, try to reconnect
             if scanner_host and not rpc_connection:
                 rpc_connection = get_scanner_connection(scanner_host, scanner_port, logger)
 
-            files_to_sync, source_files, dest_files = compare_and_get_files_to_sync(
-                source_dir, dest_dir_project, logger, rpc_connection, last_scan_time
-            )
-
+            # Without this a dead emitter would leave drain_events waiting on events that never come
+            if observer and not observer_is_alive(observer):
+                logger.error(f"Watching {source_dir} stopped (likely out of inotify watches), falling back to periodic scans.")
+                observer.stop()
+                observer.join()
+                observer = None
+
+            scan_time = None
+            if observer and initial_scan_done:
+                files_to_sync = drain_events(event_queue, source_dir, poll_interval, logger)
+            elif use_rsync and not rpc_connection and not initial_scan_done:
+                # rsync skips files that are already up to date, so the first
+                # pass can overlap the walk with the transfer and skip the dest scan
+                stream_start = time.time()
+                # The watermark only moves past this pass if rsync completed it
+                if rsync_stream_tree(source_dir, dest_dir_project, logger):
+                    scan_time = stream_start
+                files_to_sync = []
+                initial_scan_done = True
+                dest_files = None
+                scans_since_full_listing = 0
+            elif dest_files == set() and not rpc_connection and not use_rsync:
+                # Nothing to compare against in a fresh destination, so files are
+                # copied as the scan finds them instead of after it completes.
+                # The watermark is left for the next cycle's scan to set.
+                files_to_sync = iter_files_parallel(source_dir, logger)
+                initial_scan_done = True
+                scans_since_full_listing = 0
+            else:
+                # Taken before listing, so files written during the scan or the copy are seen again next time
+                scan_time = time.time()
+                # The periodic rescan lists the full source too, so files removed from the
+                # destination or given an old mtime are picked up again
+                # This counts cycles whether or not the destination set is known, so
+                # incremental scans that keep finding nothing still reach it
+                full_rescan = scans_since_full_listing >= DEST_RESCAN_CYCLES
+                if full_rescan:
+                    dest_files = None
+                # The scanner service filters by mtime on its side; a local incremental
+                # scan costs a stat per file, so it is only worth it while it can spare
+                # the destination scan
+                if full_rescan or not (rpc_connection or dest_files is None):
+                    since = 0
+                else:
+                    since = max(0, last_scan_time - WATERMARK_MARGIN_SECONDS) if last_scan_time else 0
+                # A full source listing diffed against a fresh destination scan
+                if not since and dest_files is None:
+                    scans_since_full_listing = 0
+                scan_errors = []
+                files_to_sync, dest_files = compare_and_get_files_to_sync(
+                    source_dir, dest_dir_project, logger, rpc_connection, since, dest_files, scan_errors
+                )
+                if scan_errors:
+                    # Files under unreadable paths were never listed, so the watermark must not pass them
+                    logger.warning(f"{len(scan_errors)} source paths could not be read, keeping the previous scan time.")
+                    scan_time = None
+                initial_scan_done = True
+                scans_since_full_listing += 1
+
+            synced_files = []
             if files_to_sync:
-                sync_files(source_dir, dest_dir_project, files_to_sync, logger, verbose, retries=retries)
+                synced_files = sync_files(source_dir, dest_dir_project, files_to_sync, logger, verbose, retries=retries, executor=executor, use_rsync=use_rsync, max_workers=workers, batch_bytes=batch_bytes)
+                if dest_files is not None:
+                    dest_files.update(synced_files)
+                poll_interval = timeout
             else:
                 logger.info("No new files to sync.")
+                poll_interval = min(poll_interval * 2, max_timeout)
 
-            if rpc_connection:
-                last_scan_time = time.time()
+            # The watermark only moves past a scan once everything it found was copied
+            if scan_time and len(synced_files) == len(files_to_sync):
+                last_scan_time = scan_time
+                save_last_scan_time(dest_dir_project, last_scan_time, logger)
 
-            logger.info(f"Waiting {timeout} seconds before next check...")
-            time.sleep(timeout)
+            # In watch mode drain_events already blocks until files change
+            if not observer:
+                next_check = cycle_start + poll_interval
+                logger.info(f"Waiting {max(0, next_check - time.monotonic()):.0f} seconds before next check...")
+                sleep_until(next_check)
 
     except KeyboardInterrupt:
         logger.warning("Script interrupted. Exiting...")
     finally:
+        if observer:
+            observer.stop()
+            observer.join()
         if rpc_connection:
             rpc_connection.close()
+        executor.shutdown()
         logger.info("File synchronization script completed.")
 
 if __name__ == "__main__":
@@ -207,25 +938,39 @@ if __name__ == "__main__":
     parser.add_argument("source_dir", help="Source directory to monitor and sync.")
     parser.add_argument("dest_dir", help="Destination directory to sync files to.")
     parser.add_argument("--timeout", type=int, default=60, help="Time in seconds to wait between checks for new files.")
+    parser.add_argument("--max-timeout", type=int, help="Upper bound in seconds for the wait between checks, which doubles after each check that finds no new files (default: --timeout, i.e. fixed interval).")
     parser.add_argument("--retries", type=int, default=5, help="Number of retries for checking new files.")
     parser.add_argument("-v", "--verbose", action="store_true", help="Enable verbose output to console.")
     parser.add_argument("--resume", action="store_true", help="Resume the synchronization from the last successful state.")
     # New optional arguments for RPC
     parser.add_argument("--scanner-host", help="Host running the scanner service (optional)")
     parser.add_argument("--scanner-port", type=int, default=18861, help="Port of the scanner service")
+    parser.add_argument("--watch", action="store_true", help="Detect new files with filesystem events (requires watchdog) instead of rescanning every timeout.")
+    parser.add_argument("--rsync", action="store_true", help="Copy each batch with a single rsync --files-from call instead of per-file copies.")
+    parser.add_argument("--workers", type=int, help=f"Number of concurrent copy threads (default: {DEFAULT_WORKERS}, or {RSYNC_WORKERS} concurrent rsync processes with --rsync).")
+    parser.add_argument("--batch-mib", type=int, help="Size copy batches by bytes: a batch ends once its files add up to this many MiB, or at 1000 files (costs one stat per file; default: fixed-count batches).")
     args = parser.parse_args()
 
     source_dir = args.source_dir
     dest_dir = args.dest_dir
     timeout = args.timeout
+    max_timeout = args.max_timeout
     retries = args.retries
     verbose = args.verbose
     resume = args.resume
     scanner_host = args.scanner_host
     scanner_port = args.scanner_port
+    watch = args.watch
+    use_rsync = args.rsync
+    workers = args.workers
+    batch_bytes = args.batch_mib * (1 << 20) if args.batch_mib else None
 
 
-    logger, error_log = setup_logging(dest_dir, os.path.basename(source_dir), verbose)
+    logger, error_log, log_listener = setup_logging(dest_dir, os.path.basename(source_dir), verbose)
 
     logger.info("Starting file synchronization script...")
-    main(source_dir, dest_dir, timeout, retries, logger, verbose, resume, scanner_host, scanner_port)
+    try:
+        main(source_dir, dest_dir, timeout, retries, logger, verbose, resume, scanner_host, scanner_port, watch, max_timeout, use_rsync, workers, batch_bytes)
+    finally:
+        # Flush whatever is still queued before the process exits
+        log_listener.stop()
@@ -18,39 +18,81 @@ class FileScannerService(rpyc.Service):
         logger.addHandler(handler)
         return logger
 
+    def _iter_new_files(self, directory, last_scan_time=None):
+        """
+        Yield paths relative to directory of files new or modified since last_scan_time.
+        A missing or zero last_scan_time means a full listing (no per-file stat).
+        """
+        # Iterative walk: no Python frame per directory and no recursion
+        # limit on deep trees; relative paths are built by concatenation
+        pending = [(directory, '')]
+        while pending:
+            current_dir, relative_prefix = pending.pop()
+            try:
+                entries = os.scandir(current_dir)
+            except OSError as e:
+                if current_dir == directory:
+                    raise
+                self.logger.error(f"Error accessing {current_dir}: {e}")
+                continue
+            with entries:
+                for entry in entries:
+                    try:
+                        # Symlinks are neither listed nor followed, matching the client's own scan
+                        if entry.is_file(follow_symlinks=False):
+                            if not last_scan_time or entry.stat().st_mtime > last_scan_time:
+                                yield relative_prefix + entry.name
+                        elif entry.is_dir(follow_symlinks=False):
+                            pending.append((entry.path, relative_prefix + entry.name + os.sep))
+                    except OSError as e:
+                        self.logger.error(f"Error accessing {entry.path}: {e}")
+                        continue
+
     def exposed_scan_directory(self, directory, last_scan_time=None):
         """
         Scan directory for new or modified files since last_scan_time.
-        Returns: list of file paths relative to directory
+        A missing or zero last_scan_time means a full listing (no per-file stat).
+        Returns: tuple of file paths relative to directory
         """
         try:
-            new_files = set()
             scan_time = time.time()
             
             self.logger.info(f"Scanning directory: {directory}")
-            
-            def scan_directory(current_dir, relative_path=''):
-                with os.scandir(current_dir) as entries:
-                    for entry in entries:
-                        entry_relative_path = os.path.join(relative_path, entry.name)
-                        try:
-                            if entry.is_file():
-                                if last_scan_time is None or entry.stat().st_mtime > last_scan_time:
-                                    new_files.add(entry_relative_path)
-                            elif entry.is_dir():
-                                scan_directory(entry.path, entry_relative_path)
-                        except OSError as e:
-                            self.logger.error(f"Error accessing {entry.path}: {e}")
-                            continue
-            
-            scan_directory(directory)
+            # A tuple crosses rpyc by value; a list would arrive as a netref
+            # costing a round trip per element
+            new_files = tuple(self._iter_new_files(directory, last_scan_time))
             self.logger.info(f"Scan complete. Found {len(new_files)} new/modified files")
-            return list(new_files), scan_time
+            return new_files, scan_time
             
         except Exception as e:
             self.logger.error(f"Error scanning directory {directory}: {e}")
             raise
 
+    def exposed_scan_directory_pages(self, directory, last_scan_time=None, page_size=10000):
+        """
+        Same scan as scan_directory, streamed while the walk is still running.
+        Yields: pages of up to page_size file paths relative to directory, each
+        packed into one bytes object as NUL-separated os.fsencode()d paths
+        """
+        try:
+            self.logger.info(f"Scanning directory: {directory}")
+            found_files = 0
+            page = []
+            for path in self._iter_new_files(directory, last_scan_time):
+                page.append(path)
+                if len(page) >= page_size:
+                    found_files += len(page)
+                    yield b'\0'.join(map(os.fsencode, page))
+                    page = []
+            if page:
+                found_files += len(page)
+                yield b'\0'.join(map(os.fsencode, page))
+            self.logger.info(f"Scan complete. Found {found_files} new/modified files")
+
+        except Exception as e:
+            self.logger.error(f"Error scanning directory {directory}: {e}")
+            raise
+
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="File Scanner RPC Service")